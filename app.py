@@ -11,12 +11,16 @@ from datetime import date
 import os
 
 from db_manager import DBManager
+from snapshot import SnapshotReader
 import conversation as cs
 from defaults import DEFAULT_FACTORIES, DEFAULT_ROLES
 
 # Line bot鑰匙
 CHANNEL_ACCESS_TOKEN = os.getenv("LINE_CHANNEL_ACCESS_TOKEN")
 CHANNEL_SECRET = os.getenv("LINE_CHANNEL_SECRET")
+# 設定後啟用共用快照模式：worker 不常駐資料，讀取改由 mmap 的唯讀快照，多個 worker 共用一份資料；
+# 寫入在跨 process 鎖內從 JSON 重新載入後進行，並發佈新一代快照
+SNAPSHOT_PATH = os.getenv("DB_SNAPSHOT_PATH")
 # ----------------------------------------------------
 
 app = Flask(__name__)
@@ -24,14 +28,33 @@ handler = WebhookHandler(CHANNEL_SECRET)
 line_bot_api = LineBotApi(CHANNEL_ACCESS_TOKEN)
 
 # 資料庫
-db = DBManager()
+db = DBManager(snapshot_path=SNAPSHOT_PATH)
 db.seed_factories(DEFAULT_FACTORIES)
 
+# 讀取來源：快照模式用 SnapshotReader，否則直接讀 db
+# 啟動時一律從 JSON 重新發佈，避免沿用與 data/*.json 不一致的舊快照
+if SNAPSHOT_PATH:
+    db.publish_snapshot()
+    reader = SnapshotReader(SNAPSHOT_PATH)
+else:
+    reader = db
+
+# 非同步模式（asgi_app.py）啟動時會設定，改由事件迴圈送出訊息
+async_sender = None
+
 # ----------------- 常用函式 --------------------
 def reply_text(reply_token, text):
+    sender = async_sender
+    if sender:
+        sender.reply(reply_token, TextSendMessage(text=text))
+        return
     line_bot_api.reply_message(reply_token, TextSendMessage(text=text))
 
 def push_text(user_id, text):
+    sender = async_sender
+    if sender:
+        sender.push(user_id, TextSendMessage(text=text))
+        return
     line_bot_api.push_message(user_id, TextSendMessage(text=text))
 
 
@@ -72,7 +95,7 @@ def handle_message(event):
         return
     
     # 只有管理員可以維護廠區與設備
-    user = db.get_user(user_id)
+    user = reader.get_user(user_id)
 
     # 新增廠區：格式「新增廠區 北區二廠」
     if msg.startswith("新增廠區"):
@@ -193,7 +216,7 @@ def handle_registration(event, state):
                 cs.set_temp(user_id, "role", role)
                 cs.advance(user_id)
 
-                factories = db.get_factories()
+                factories = reader.get_factories()
                 reply_text(
                     reply_token,
                     "請選擇主要廠區（輸入數字）：\n" +
@@ -206,7 +229,7 @@ def handle_registration(event, state):
 
     # STEP 3：主要廠區
     if step == 3:
-        factories = db.get_factories()
+        factories = reader.get_factories()
         if msg.isdigit():
             idx = int(msg) - 1
             if 0 <= idx < len(factories):
@@ -248,7 +271,7 @@ def handle_registration(event, state):
         if msg_norm in ["是", "有", "Y", "y"]:
             cs.advance(user_id)
 
-            factories = db.get_factories()
+            factories = reader.get_factories()
             primary_factory = cs.get_temp(user_id, "primary_factory")
             # 排除已選的主要廠區
             options = [f for f in factories if f != primary_factory]
@@ -375,7 +398,7 @@ def _finish_registration_with_second(user_id, reply_token):
 # ----------------- 查詢任務 --------------------
 def show_today_tasks(event, user_id):
     today = date.today().isoformat()
-    tasks = [t for t in db.get_tasks_by_date(today) if t["assigned_user_id"] == user_id]
+    tasks = [t for t in reader.get_tasks_by_date(today) if t["assigned_user_id"] == user_id]
 
     if not tasks:
         reply_text(event.reply_token, "今天沒有任務。")
@@ -396,43 +419,49 @@ def show_today_tasks(event, user_id):
 # ----------------- 任務派送（依優先級） --------------------
 def assign_daily_tasks():
     today = date.today().isoformat()
-    factories = db.get_factories()
-    users = db.get_all_users()
+    pushes = []
 
-    for fac in factories:
-        candidates = []
+    # 整批派任在同一個 transaction 內完成，快照模式下只發佈一次
+    with db.transaction():
+        factories = db.get_factories()
+        users = db.get_all_users()
 
-        # 找所有負責此廠區的維修員
-        for user in users:
-            role = user.get("role", "")
-            fp = user.get("factory_priority", {})
+        for fac in factories:
+            candidates = []
 
-            if role != "維修員":
-                continue
+            # 找所有負責此廠區的維修員
+            for user in users:
+                role = user.get("role", "")
+                fp = user.get("factory_priority", {})
 
-            if fac in fp:   # 此人負責這個廠區
-                candidates.append((user, fp[fac]))
+                if role != "維修員":
+                    continue
 
-        if not candidates:
-            continue
+                if fac in fp:   # 此人負責這個廠區
+                    candidates.append((user, fp[fac]))
 
-        # 依照優先級排序（小 → 大）
-        candidates.sort(key=lambda x: x[1])
-        chosen = candidates[0][0]  # 取最優先者
+            if not candidates:
+                continue
 
-        # 模擬派任
-        machine = f"逆變器-{fac[-1]}01"
-        task = db.create_task(
-            factory=fac,
-            machine=machine,
-            assigned_user_id=chosen["user_id"],
-            task_type="例行巡檢",
-            date_str=today
-        )
+            # 依照優先級排序（小 → 大）
+            candidates.sort(key=lambda x: x[1])
+            chosen = candidates[0][0]  # 取最優先者
+
+            # 模擬派任
+            machine = f"逆變器-{fac[-1]}01"
+            task = db.create_task(
+                factory=fac,
+                machine=machine,
+                assigned_user_id=chosen["user_id"],
+                task_type="例行巡檢",
+                date_str=today
+            )
+            pushes.append((chosen["user_id"], fac, machine, task))
 
-        # 推播任務
+    # 推播任務（放在 transaction 外，避免送訊時還佔著鎖）
+    for user_id, fac, machine, task in pushes:
         push_text(
-            chosen["user_id"],
+            user_id,
             f"📌 今日任務\n廠區：{fac}\n機台：{machine}\n任務ID：{task['id']}\n完成後回覆：完成 {task['id']}"
         )
 
@@ -450,8 +479,8 @@ schedule.every().day.at("08:30").do(assign_daily_tasks)
 
 # ----------------- 主程式 --------------------
 if __name__ == "__main__":
-    print("目前廠區：", db.get_factories())
-    print("目前使用者：", db.get_all_users())
+    print("目前廠區：", reader.get_factories())
+    print("目前使用者：", reader.get_all_users())
     print("Render auto deploy test")
 
     t = threading.Thread(target=schedule_loop, daemon=True)
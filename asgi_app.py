@@ -0,0 +1,183 @@
+# asgi_app.py
+# 非同步（ASGI）入口：/callback 在事件迴圈上接收，LINE 回覆／推播改用 aiohttp 連線池送出。
+# 驗證簽章後立刻回 200，事件處理沿用 app.py 的 handler，在專用的單一執行緒上依序執行，
+# 不會卡住事件迴圈，也不會讓 handler 彼此搶著改 DBManager 與註冊狀態。
+#
+# 吞吐量限制：webhook 的接收與送訊可以大量並行，但 handler 本身（含 DBManager 寫入）一次只跑一個，
+# 同一時間湧入的事件會在 handler 執行緒上排隊。快照模式下每次寫入都要拿檔案鎖、重新讀 JSON、
+# 重寫快照並 fsync，寫入多時排隊會更明顯（只影響事件處理延遲，不影響 webhook 回應）。
+#
+# 啟動：uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+# 排程只在 python asgi_app.py 直接執行，或設定 RUN_SCHEDULER=1 時啟動；
+# 多個 worker 時只能讓其中一個啟動排程，否則每天會重複派任。
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+from linebot import AsyncLineBotApi
+from linebot.aiohttp_async_http_client import AiohttpAsyncHttpClient
+
+import app as bot
+
+# 對 LINE API 的最大同時連線數
+MAX_CONNECTIONS = 100
+
+
+# ----------------- 非同步送訊 --------------------
+class AsyncSender:
+    """讓執行緒中的同步 handler 把訊息交給事件迴圈送出，不等待結果"""
+
+    def __init__(self, loop, api):
+        self.loop = loop
+        self.api = api
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def reply(self, reply_token, message):
+        self._submit(self.api.reply_message(reply_token, message))
+
+    def push(self, user_id, message):
+        self._submit(self.api.push_message(user_id, message))
+
+    def _submit(self, coro):
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        with self._lock:
+            self._pending.discard(future)
+        _report_error(future, "LINE 送訊失敗：")
+
+    async def drain(self):
+        """等待已送出的訊息全部完成"""
+        while True:
+            with self._lock:
+                pending = list(self._pending)
+            if not pending:
+                return
+            await asyncio.gather(*(asyncio.wrap_future(f) for f in pending), return_exceptions=True)
+
+
+def _report_error(future, prefix):
+    if future.cancelled():
+        return
+    err = future.exception()
+    if err:
+        print(prefix, err)
+
+
+# ----------------- ASGI --------------------
+session = None
+sender = None
+
+# handler 只在這個執行緒上依序執行，見檔頭的吞吐量限制
+handler_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="line-handler")
+
+
+async def _startup():
+    global session, sender
+    session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=MAX_CONNECTIONS))
+    api = AsyncLineBotApi(bot.CHANNEL_ACCESS_TOKEN, AiohttpAsyncHttpClient(session))
+    sender = AsyncSender(asyncio.get_running_loop(), api)
+    bot.async_sender = sender
+
+    if os.getenv("RUN_SCHEDULER") == "1":
+        t = threading.Thread(target=bot.schedule_loop, daemon=True)
+        t.start()
+
+
+async def _shutdown():
+    # 先讓排隊中的 handler 跑完，再等它們送出的訊息完成，最後才關連線池
+    await asyncio.to_thread(handler_executor.shutdown, True)
+    bot.async_sender = None
+    if sender:
+        await sender.drain()
+    if session:
+        await session.close()
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await _startup()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await _shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def _read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _respond(send, status, text):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"text/plain; charset=utf-8")],
+    })
+    await send({"type": "http.response.body", "body": text.encode("utf-8")})
+
+
+def _handle_error(future):
+    _report_error(future, "事件處理失敗：")
+
+
+async def callback(scope, receive, send):
+    headers = dict(scope["headers"])
+    signature = headers.get(b"x-line-signature")
+    body = await _read_body(receive)
+
+    if signature is None:
+        await _respond(send, 400, "Bad Request")
+        return
+
+    body = body.decode("utf-8")
+    signature = signature.decode("utf-8")
+    if not bot.handler.parser.signature_validator.validate(body, signature):
+        await _respond(send, 400, "Bad Request")
+        return
+
+    # 簽章正確就先回 200，事件交給 handler 執行緒排隊處理
+    future = handler_executor.submit(bot.handler.handle, body, signature)
+    future.add_done_callback(_handle_error)
+
+    await _respond(send, 200, "OK")
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+
+    if scope["type"] != "http":
+        return
+
+    if scope["path"] != "/callback":
+        await _respond(send, 404, "Not Found")
+        return
+
+    if scope["method"] != "POST":
+        await _respond(send, 405, "Method Not Allowed")
+        return
+
+    await callback(scope, receive, send)
+
+
+# ----------------- 主程式 --------------------
+if __name__ == "__main__":
+    import uvicorn
+
+    os.environ.setdefault("RUN_SCHEDULER", "1")
+    uvicorn.run(app, host="0.0.0.0", port=5000)
@@ -1,7 +1,12 @@
 import os
 import json
+import fcntl
+import threading
+from contextlib import contextmanager
 from datetime import date
 
+import snapshot
+
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 os.makedirs(DATA_DIR, exist_ok=True)
 
@@ -21,17 +26,73 @@ def _load(path, default):
 
 
 def _save(path, obj):
-    with open(path, "w", encoding="utf-8") as f:
+    # 先寫暫存檔再替換，寫到一半中斷也不會留下壞掉的 JSON
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
         json.dump(obj, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
 
 
 # ------------------- 主類別 -------------------
 class DBManager:
-    def __init__(self):
-        self.users = _load(USERS_FILE, [])      # list of dicts
-        self.tasks = _load(TASKS_FILE, [])      # list of dicts
-        self.factories = _load(FACTORIES_FILE, [])  # list of strings
-        self.equipments = _load(EQUIPMENTS_FILE, [])   # list of dicts
+    def __init__(self, snapshot_path=None):
+        # 有設定 snapshot_path 時為快照模式：資料不常駐記憶體，只在 transaction 內從 JSON 載入，
+        # 寫入後由同一個 transaction 發佈唯讀快照，其他 worker 以 mmap 讀取。
+        # 注意：快照模式下每次直接呼叫 DBManager（包含 get_* 讀取）都會拿跨 process 檔案鎖並重新讀入
+        # 全部 JSON，有寫入時還會重寫快照並 fsync；熱路徑的讀取請改用 snapshot.SnapshotReader。
+        self.snapshot_path = snapshot_path
+        # handler 與排程可能在不同執行緒同時讀寫，所有存取都經由 transaction() 持有這把鎖
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._dirty = False
+        self._lock_file = None
+        self.users = []         # list of dicts
+        self.tasks = []         # list of dicts
+        self.factories = []     # list of strings
+        self.equipments = []    # list of dicts
+        if not snapshot_path:
+            self._reload()
+
+    def _reload(self):
+        self.users = _load(USERS_FILE, [])
+        self.tasks = _load(TASKS_FILE, [])
+        self.factories = _load(FACTORIES_FILE, [])
+        self.equipments = _load(EQUIPMENTS_FILE, [])
+
+    def _release(self):
+        self.users, self.tasks, self.factories, self.equipments = [], [], [], []
+
+    @contextmanager
+    def transaction(self):
+        """
+        持有鎖執行一批讀寫，可巢狀。
+        快照模式下最外層另外持有跨 process 的檔案鎖：進入時從 JSON 重新載入最新資料，
+        離開時若有寫入就發佈一次快照，然後釋放記憶體。
+        """
+        with self._lock:
+            outer = self._depth == 0 and self.snapshot_path
+            if outer:
+                self._lock_file = open(self.snapshot_path + ".lock", "w")
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._depth += 1
+            try:
+                if outer:
+                    self._reload()
+                yield self
+            finally:
+                self._depth -= 1
+                if outer:
+                    try:
+                        if self._dirty:
+                            self._publish_snapshot()
+                    finally:
+                        self._dirty = False
+                        self._release()
+                        fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+                        self._lock_file.close()
+                        self._lock_file = None
 
 
     # ===================== 使用者 =====================
@@ -40,30 +101,34 @@ class DBManager:
         factory_priority 格式：
         { "北區廠": 1, "東區廠": 2 }
         """
-        if self.get_user(user_id):
-            return False
+        with self.transaction():
+            if self.get_user(user_id):
+                return False
         
-        user = {
-            "user_id": user_id,
-            "name": name or "",
-            "factory_priority": factory_priority or {},  # dict
-            "role": role or ""
-        }
-        self.users.append(user)
-        self._save_users()
-        return True
+            user = {
+                "user_id": user_id,
+                "name": name or "",
+                "factory_priority": factory_priority or {},  # dict
+                "role": role or ""
+            }
+            self.users.append(user)
+            self._save_users()
+            return True
 
     def get_user(self, user_id):
-        for u in self.users:
-            if u["user_id"] == user_id:
-                return u
-        return None
+        with self.transaction():
+            for u in self.users:
+                if u["user_id"] == user_id:
+                    return u
+            return None
 
     def get_all_users(self):
-        return list(self.users)
+        with self.transaction():
+            return list(self.users)
 
     def _save_equipments(self):
         _save(EQUIPMENTS_FILE, self.equipments)
+        self._dirty = True
 
     def update_user(self, user_id, **kwargs):
         """
@@ -73,123 +138,151 @@ class DBManager:
         factory_priority={"北區廠":1, "南區廠":2}
         （會自動 merge）
         """
-        user = self.get_user(user_id)
-        if not user:
-            return False
+        with self.transaction():
+            user = self.get_user(user_id)
+            if not user:
+                return False
         
-        for key, value in kwargs.items():
-            if key == "factory_priority":
-                # 重要：支援合併 + 更新優先級
-                if isinstance(value, dict):
-                    for fac, pri in value.items():
-                        user["factory_priority"][fac] = pri
-            elif key in user:
-                user[key] = value
+            for key, value in kwargs.items():
+                if key == "factory_priority":
+                    # 重要：支援合併 + 更新優先級
+                    if isinstance(value, dict):
+                        for fac, pri in value.items():
+                            user["factory_priority"][fac] = pri
+                elif key in user:
+                    user[key] = value
         
-        self._save_users()
-        return True
+            self._save_users()
+            return True
 
     # ===================== 廠區 =====================
     def seed_factories(self, names):
         """若無廠區資料，則初始化"""
-        if not self.factories:
-            self.factories = names
-            self._save_factories()
+        with self.transaction():
+            if not self.factories:
+                self.factories = names
+                self._save_factories()
 
     def get_factories(self):
-        return list(self.factories)
+        with self.transaction():
+            return list(self.factories)
 
     def add_factory(self, name: str):
         """新增廠區名稱，如果已存在就回 False"""
-        name = name.strip()
-        if not name:
-            return False
-        if name in self.factories:
-            return False
-        self.factories.append(name)
-        self._save_factories()
-        return True
+        with self.transaction():
+            name = name.strip()
+            if not name:
+                return False
+            if name in self.factories:
+                return False
+            self.factories.append(name)
+            self._save_factories()
+            return True
 
     def delete_factory(self, name: str):
         """刪除廠區，若不存在回 False"""
-        name = name.strip()
-        if name not in self.factories:
-            return False
-        self.factories.remove(name)
-        self._save_factories()
-        return True
+        with self.transaction():
+            name = name.strip()
+            if name not in self.factories:
+                return False
+            self.factories.remove(name)
+            self._save_factories()
+            return True
 
 
     # ===================== 任務 =====================
     def create_task(self, factory, machine, assigned_user_id, task_type="巡檢", date_str=None):
         """建立任務"""
-        if date_str is None:
-            date_str = date.today().isoformat()
-
-        task = {
-            "id": len(self.tasks) + 1,
-            "factory": factory,
-            "machine": machine,
-            "assigned_user_id": assigned_user_id,
-            "task_type": task_type,
-            "date": date_str,
-            "status": "待執行"
-        }
-        self.tasks.append(task)
-        self._save_tasks()
-        return task
+        with self.transaction():
+            if date_str is None:
+                date_str = date.today().isoformat()
+
+            task = {
+                "id": len(self.tasks) + 1,
+                "factory": factory,
+                "machine": machine,
+                "assigned_user_id": assigned_user_id,
+                "task_type": task_type,
+                "date": date_str,
+                "status": "待執行"
+            }
+            self.tasks.append(task)
+            self._save_tasks()
+            return task
 
     def get_tasks_by_date(self, date_str):
-        return [t for t in self.tasks if t["date"] == date_str]
+        with self.transaction():
+            return [t for t in self.tasks if t["date"] == date_str]
 
     def update_task_status(self, task_id, status):
-        for t in self.tasks:
-            if t["id"] == task_id:
-                t["status"] = status
-                self._save_tasks()
-                return True
-        return False
+        with self.transaction():
+            for t in self.tasks:
+                if t["id"] == task_id:
+                    t["status"] = status
+                    self._save_tasks()
+                    return True
+            return False
 
     def add_equipment(self, factory: str, name: str, eq_type: str = ""):
         """新增設備，回傳設備物件"""
-        factory = factory.strip()
-        name = name.strip()
-        if not factory or not name:
-            return None
+        with self.transaction():
+            factory = factory.strip()
+            name = name.strip()
+            if not factory or not name:
+                return None
 
-        # 建 ID（簡單用長度+1）
-        eq_id = len(self.equipments) + 1
-        eq = {
-            "id": eq_id,
-            "factory": factory,
-            "name": name,
-            "type": eq_type
-        }
-        self.equipments.append(eq)
-        self._save_equipments()
-        return eq
+            # 建 ID（簡單用長度+1）
+            eq_id = len(self.equipments) + 1
+            eq = {
+                "id": eq_id,
+                "factory": factory,
+                "name": name,
+                "type": eq_type
+            }
+            self.equipments.append(eq)
+            self._save_equipments()
+            return eq
 
     def delete_equipment(self, eq_id: int):
         """用 id 刪除設備"""
-        for i, e in enumerate(self.equipments):
-            if e["id"] == eq_id:
-                self.equipments.pop(i)
-                self._save_equipments()
-                return True
-        return False
+        with self.transaction():
+            for i, e in enumerate(self.equipments):
+                if e["id"] == eq_id:
+                    self.equipments.pop(i)
+                    self._save_equipments()
+                    return True
+            return False
 
     def list_equipments(self, factory: str | None = None):
-        if not factory:
-            return list(self.equipments)
-        return [e for e in self.equipments if e["factory"] == factory]
+        with self.transaction():
+            if not factory:
+                return list(self.equipments)
+            return [e for e in self.equipments if e["factory"] == factory]
 
 
     # ===================== 儲存 =====================
     def _save_users(self):
         _save(USERS_FILE, self.users)
+        self._dirty = True
 
     def _save_tasks(self):
         _save(TASKS_FILE, self.tasks)
+        self._dirty = True
 
     def _save_factories(self):
         _save(FACTORIES_FILE, self.factories)
+        self._dirty = True
+
+
+    # ===================== 快照 =====================
+    def publish_snapshot(self):
+        """從 JSON 重新發佈快照（例如啟動時），未設定 snapshot_path 則略過"""
+        if not self.snapshot_path:
+            return
+        with self.transaction():
+            self._dirty = True
+
+    def _publish_snapshot(self):
+        # 只在持有檔案鎖時呼叫，generation 不會跟其他 process 重複
+        generation = snapshot.read_generation(self.snapshot_path) + 1
+        return snapshot.write_snapshot(self.snapshot_path, self, generation)
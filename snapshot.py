@@ -0,0 +1,223 @@
+# snapshot.py
+# 唯讀快照：寫入端把 DBManager 的資料發佈成一個不可變的檔案，各 worker 用 mmap 共用同一份資料。
+#
+# 檔案格式（little-endian）：
+#   header：magic(8) generation(Q)
+#           users_index(off Q, count Q) tasks_index(off Q, count Q) dates_index(off Q, count Q)
+#           factories(off Q, len Q) equipments(off Q, len Q) users_order(off Q, count Q)
+#   資料區：每筆記錄為緊湊 JSON（utf-8），索引的 key 也存在這裡
+#   索引區：依 key 排序的 (key_off, key_len, rec_off, rec_len)，用二分搜尋查找；
+#           users_order 格式相同但維持寫入順序，讓 get_all_users 與 DBManager 順序一致
+#
+# 發佈由 DBManager 在跨 process 檔案鎖內進行（generation 也在鎖內決定），
+# 先寫暫存檔再 os.replace，讀取端偵測到檔案換代就重新 mmap，舊的 mmap 仍可安全讀完。
+import os
+import json
+import mmap
+import struct
+import threading
+
+MAGIC = b"EBSNAP01"
+HEADER = struct.Struct("<8sQ" + "QQ" * 6)
+ENTRY = struct.Struct("<QIQI")
+
+
+def _dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# ------------------- 寫入 -------------------
+def write_snapshot(path, db, generation):
+    """把 db 目前的 users / tasks / factories / equipments 發佈成第 generation 代快照檔"""
+    data = bytearray()
+
+    def put(raw):
+        off = HEADER.size + len(data)
+        data.extend(raw)
+        return off, len(raw)
+
+    def build_index(items):
+        # items: [(key, (rec_off, rec_len))]，依 key 穩定排序，同 key 保留原本順序
+        entries = []
+        for key, (rec_off, rec_len) in sorted(items, key=lambda x: x[0]):
+            key_off, key_len = put(key)
+            entries.append(ENTRY.pack(key_off, key_len, rec_off, rec_len))
+        return entries
+
+    user_items = [(u["user_id"].encode("utf-8"), put(_dumps(u))) for u in db.users]
+    user_entries = build_index(user_items)
+    order_entries = [
+        ENTRY.pack(0, 0, rec_off, rec_len) for _, (rec_off, rec_len) in user_items
+    ]
+
+    # 每筆任務只存一份，id 與日期兩個索引指向同一筆記錄
+    task_recs = [(t, put(_dumps(t))) for t in db.tasks]
+    task_entries = build_index(
+        [(str(t["id"]).encode("utf-8"), rec) for t, rec in task_recs]
+    )
+    date_entries = build_index(
+        [(t["date"].encode("utf-8"), rec) for t, rec in task_recs]
+    )
+
+    factories_off, factories_len = put(_dumps(db.factories))
+    equipments_off, equipments_len = put(_dumps(db.equipments))
+
+    sections = []
+    for entries in (user_entries, task_entries, date_entries, order_entries):
+        off = HEADER.size + len(data)
+        data.extend(b"".join(entries))
+        sections.extend([off, len(entries)])
+
+    header = HEADER.pack(
+        MAGIC, generation, *sections[:6],
+        factories_off, factories_len, equipments_off, equipments_len,
+        *sections[6:]
+    )
+
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return generation
+
+
+def read_generation(path):
+    """讀取目前快照的 generation，沒有快照時為 0"""
+    try:
+        with open(path, "rb") as f:
+            raw = f.read(HEADER.size)
+    except FileNotFoundError:
+        return 0
+    if len(raw) < HEADER.size or raw[:8] != MAGIC:
+        return 0
+    return HEADER.unpack(raw)[1]
+
+
+# ------------------- 讀取 -------------------
+class _Generation:
+    """單一代快照的 mmap 與 header"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+
+        fields = HEADER.unpack_from(self.mm, 0)
+        if fields[0] != MAGIC:
+            self.mm.close()
+            raise ValueError(f"不是有效的快照檔：{path}")
+
+        self.generation = fields[1]
+        self.users = (fields[2], fields[3])
+        self.tasks = (fields[4], fields[5])
+        self.dates = (fields[6], fields[7])
+        self.factories = (fields[8], fields[9])
+        self.equipments = (fields[10], fields[11])
+        self.users_order = (fields[12], fields[13])
+
+    def _entry(self, index, i):
+        return ENTRY.unpack_from(self.mm, index[0] + i * ENTRY.size)
+
+    def _key(self, index, i):
+        key_off, key_len, _, _ = self._entry(index, i)
+        return self.mm[key_off:key_off + key_len]
+
+    def record(self, index, i):
+        _, _, rec_off, rec_len = self._entry(index, i)
+        return json.loads(self.mm[rec_off:rec_off + rec_len])
+
+    def blob(self, section):
+        off, length = section
+        return json.loads(self.mm[off:off + length])
+
+    def bisect_left(self, index, key):
+        lo, hi = 0, index[1]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(index, mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def bisect_right(self, index, key):
+        lo, hi = 0, index[1]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if key < self._key(index, mid):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def find(self, index, key):
+        i = self.bisect_left(index, key)
+        if i < index[1] and self._key(index, i) == key:
+            return self.record(index, i)
+        return None
+
+
+class SnapshotReader:
+    """
+    以 mmap 讀取快照，介面與 DBManager 的讀取方法相同。
+    每次查詢前檢查檔案是否已換代，有的話切換到新的 mmap。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._gen = None
+
+    def _current(self):
+        st = os.stat(self.path)
+        gen = self._gen
+        if gen and gen.stamp == (st.st_ino, st.st_mtime_ns, st.st_size):
+            return gen
+
+        with self._lock:
+            if self._gen is gen:
+                # 舊的 mmap 不主動 close，讓其他執行緒手上的查詢讀完後自然回收
+                self._gen = _Generation(self.path)
+            return self._gen
+
+    @property
+    def generation(self):
+        return self._current().generation
+
+    # ===================== 使用者 =====================
+    def get_user(self, user_id):
+        gen = self._current()
+        return gen.find(gen.users, user_id.encode("utf-8"))
+
+    def get_all_users(self):
+        gen = self._current()
+        return [gen.record(gen.users_order, i) for i in range(gen.users_order[1])]
+
+    # ===================== 廠區 =====================
+    def get_factories(self):
+        gen = self._current()
+        return gen.blob(gen.factories)
+
+    # ===================== 任務 =====================
+    def get_task(self, task_id):
+        gen = self._current()
+        return gen.find(gen.tasks, str(task_id).encode("utf-8"))
+
+    def get_tasks_by_date(self, date_str):
+        gen = self._current()
+        key = date_str.encode("utf-8")
+        lo = gen.bisect_left(gen.dates, key)
+        hi = gen.bisect_right(gen.dates, key)
+        return [gen.record(gen.dates, i) for i in range(lo, hi)]
+
+    # ===================== 設備 =====================
+    def list_equipments(self, factory: str | None = None):
+        gen = self._current()
+        equipments = gen.blob(gen.equipments)
+        if not factory:
+            return equipments
+        return [e for e in equipments if e["factory"] == factory]
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_manager
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """把 DBManager 的 JSON 檔改到暫存目錄"""
+    monkeypatch.setattr(db_manager, "USERS_FILE", str(tmp_path / "users.json"))
+    monkeypatch.setattr(db_manager, "TASKS_FILE", str(tmp_path / "tasks.json"))
+    monkeypatch.setattr(db_manager, "FACTORIES_FILE", str(tmp_path / "factories.json"))
+    monkeypatch.setattr(db_manager, "EQUIPMENTS_FILE", str(tmp_path / "equipments.json"))
+    return tmp_path
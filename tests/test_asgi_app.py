@@ -0,0 +1,78 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import importlib
+import os
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("linebot")
+pytest.importorskip("aiohttp")
+
+import db_manager
+
+SECRET = "test-secret"
+
+
+@pytest.fixture(scope="module")
+def asgi_app(tmp_path_factory):
+    # app.py 在 import 時就建立 DBManager 並讀取金鑰，要在 import 前設定好
+    tmp = tmp_path_factory.mktemp("data")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("LINE_CHANNEL_SECRET", SECRET)
+        mp.setenv("LINE_CHANNEL_ACCESS_TOKEN", "test-token")
+        mp.delenv("DB_SNAPSHOT_PATH", raising=False)
+        for name in ("USERS_FILE", "TASKS_FILE", "FACTORIES_FILE", "EQUIPMENTS_FILE"):
+            mp.setattr(db_manager, name, str(tmp / os.path.basename(getattr(db_manager, name))))
+        yield importlib.import_module("asgi_app")
+
+
+def _sign(body):
+    digest = hmac.new(SECRET.encode("utf-8"), body, hashlib.sha256).digest()
+    return base64.b64encode(digest)
+
+
+def _call(app, method, path, body=b"", headers=()):
+    scope = {"type": "http", "method": method, "path": path, "headers": list(headers)}
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return sent[0]["status"], sent[1]["body"]
+
+
+def test_unknown_path_is_404(asgi_app):
+    assert _call(asgi_app.app, "POST", "/other")[0] == 404
+
+
+def test_callback_requires_post(asgi_app):
+    assert _call(asgi_app.app, "GET", "/callback")[0] == 405
+
+
+def test_missing_signature_is_400(asgi_app):
+    assert _call(asgi_app.app, "POST", "/callback", b"{}")[0] == 400
+
+
+def test_invalid_signature_is_400(asgi_app):
+    headers = [(b"x-line-signature", b"bad")]
+    assert _call(asgi_app.app, "POST", "/callback", b"{}", headers)[0] == 400
+
+
+def test_valid_signature_dispatches_to_handler(asgi_app, monkeypatch):
+    calls = []
+    monkeypatch.setattr(asgi_app.bot.handler, "handle", lambda body, sig: calls.append(body))
+    body = b'{"destination":"x","events":[]}'
+    headers = [(b"x-line-signature", _sign(body))]
+
+    assert _call(asgi_app.app, "POST", "/callback", body, headers) == (200, b"OK")
+
+    asgi_app.handler_executor.submit(lambda: None).result()
+    assert calls == [body.decode("utf-8")]
@@ -0,0 +1,107 @@
+import multiprocessing
+
+from db_manager import DBManager
+from snapshot import SnapshotReader
+
+
+def _snapshot_db(data_dir):
+    path = str(data_dir / "snap.bin")
+    db = DBManager(snapshot_path=path)
+    db.seed_factories(["北區廠", "南區廠"])
+    db.publish_snapshot()
+    return db, SnapshotReader(path)
+
+
+def test_round_trip(data_dir):
+    db, reader = _snapshot_db(data_dir)
+    db.add_user("U2", "乙", {"北區廠": 1}, "維修員")
+    db.add_user("U1", "甲", {"南區廠": 2}, "管理員")
+    db.create_task("北區廠", "m1", "U2", date_str="2026-10-19")
+    db.create_task("南區廠", "m2", "U1", date_str="2026-10-18")
+    db.create_task("南區廠", "m3", "U1", date_str="2026-10-19")
+    db.add_equipment("北區廠", "PCS-01")
+    db.add_equipment("南區廠", "PCS-02")
+
+    assert reader.get_user("U1")["role"] == "管理員"
+    assert reader.get_user("U3") is None
+    assert [u["user_id"] for u in reader.get_all_users()] == ["U2", "U1"]
+    assert reader.get_task(2)["machine"] == "m2"
+    assert reader.get_task(99) is None
+    assert [t["id"] for t in reader.get_tasks_by_date("2026-10-19")] == [1, 3]
+    assert reader.get_tasks_by_date("2026-10-20") == []
+    assert reader.get_factories() == ["北區廠", "南區廠"]
+    assert [e["name"] for e in reader.list_equipments("南區廠")] == ["PCS-02"]
+    assert len(reader.list_equipments()) == 2
+
+
+def test_reader_swaps_generation(data_dir):
+    db, reader = _snapshot_db(data_dir)
+    before = reader.generation
+    assert reader.get_user("U1") is None
+
+    db.add_user("U1", "甲", {}, "管理員")
+
+    assert reader.generation == before + 1
+    assert reader.get_user("U1")["name"] == "甲"
+
+
+def test_no_resident_copy_between_transactions(data_dir):
+    db, _ = _snapshot_db(data_dir)
+    db.add_user("U1", "甲", {}, "管理員")
+    assert db.users == [] and db.tasks == [] and db.factories == []
+
+
+def test_writers_do_not_drop_each_others_changes(data_dir):
+    a, reader = _snapshot_db(data_dir)
+    b = DBManager(snapshot_path=a.snapshot_path)
+
+    a.add_user("U1", "甲", {}, "管理員")
+    b.add_factory("東區廠")
+
+    assert reader.get_user("U1")["role"] == "管理員"
+    assert reader.get_factories() == ["北區廠", "南區廠", "東區廠"]
+
+
+def test_transaction_publishes_once(data_dir):
+    db, reader = _snapshot_db(data_dir)
+    before = reader.generation
+
+    with db.transaction():
+        for _ in range(5):
+            db.create_task("北區廠", "m", "U1", date_str="2026-10-19")
+
+    assert reader.generation == before + 1
+    assert len(reader.get_tasks_by_date("2026-10-19")) == 5
+
+
+def test_startup_republishes_json_changes(data_dir):
+    db, reader = _snapshot_db(data_dir)
+    DBManager().add_user("U9", "丙", {}, "管理員")
+    assert reader.get_user("U9") is None
+
+    DBManager(snapshot_path=db.snapshot_path).publish_snapshot()
+
+    assert reader.get_user("U9")["name"] == "丙"
+
+
+def _create_tasks(path, n):
+    db = DBManager(snapshot_path=path)
+    for _ in range(10):
+        db.create_task("南區廠", f"p{n}", "U1", date_str="2026-10-20")
+
+
+def test_cross_process_writes_are_serialized(data_dir):
+    db, reader = _snapshot_db(data_dir)
+    before = reader.generation
+
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_create_tasks, args=(db.snapshot_path, n)) for n in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+
+    ids = [t["id"] for t in reader.get_tasks_by_date("2026-10-20")]
+    assert sorted(ids) == list(range(1, 41))
+    assert reader.generation == before + 40